@@ -7,6 +7,7 @@ import pygame
 import os
 import logging
 import urllib.parse
+from storage_manager import StorageManager, ClipRecorder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -95,14 +96,21 @@ def initialize_wifi_camera(camera_config):
         
     return cap
 
-def main(camera_config, motion_area_threshold=500, sound_file='sound.mp3'):
+def main(camera_config, motion_area_threshold=500, sound_file='sound.mp3', storage=None,
+         motion_timeout=5.0, max_clip_seconds=300):
     start_program_time = time.time()
+    camera_id = camera_config.get('name', camera_config['ip'])
     
     # Initialize WiFi camera
     cap = initialize_wifi_camera(camera_config)
     if cap is None:
         return
 
+    # Recordings go through the storage manager so quotas and retention are enforced
+    owns_storage = storage is None
+    if owns_storage:
+        storage = StorageManager()
+
     frame_width = int(cap.get(3))
     frame_height = int(cap.get(4))
     size = (frame_width, frame_height)
@@ -110,74 +118,85 @@ def main(camera_config, motion_area_threshold=500, sound_file='sound.mp3'):
     # Initialize sound controller
     sound_ctrl = SoundController(sound_file)
 
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    recorder = ClipRecorder(storage, camera_id, size, fps=20, max_clip_seconds=max_clip_seconds)
     motion_detected = False
-    video_writer = None
     fgbg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=True)
 
     motion_start_time = None
+    last_motion_time = None
     reconnect_attempts = 0
     max_reconnect_attempts = 5
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            logging.error("Error: Could not read frame.")
-            reconnect_attempts += 1
-            if reconnect_attempts < max_reconnect_attempts:
-                logging.info(f"Attempting to reconnect... ({reconnect_attempts}/{max_reconnect_attempts})")
-                time.sleep(2)  # Wait before reconnecting
-                cap = initialize_wifi_camera(camera_config)
-                if cap is None:
-                    continue
-            else:
-                logging.error("Maximum reconnection attempts reached. Exiting.")
+    storage.start()
+    try:
+        while True:
+            ret, frame = cap.read() if cap is not None else (False, None)
+            if not ret:
+                logging.error("Error: Could not read frame.")
+                reconnect_attempts += 1
+                if reconnect_attempts < max_reconnect_attempts:
+                    logging.info(f"Attempting to reconnect... ({reconnect_attempts}/{max_reconnect_attempts})")
+                    time.sleep(2)  # Wait before reconnecting
+                    if cap is not None:
+                        cap.release()
+                    cap = initialize_wifi_camera(camera_config)
+                else:
+                    logging.error("Maximum reconnection attempts reached. Exiting.")
+                    break
+                continue
+
+            reconnect_attempts = 0  # Reset reconnect attempts on successful frame read
+
+            fgmask = fgbg.apply(frame)
+            _, thresh = cv2.threshold(fgmask, 244, 255, cv2.THRESH_BINARY)
+            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+            for contour in contours:
+                if cv2.contourArea(contour) > motion_area_threshold:
+                    last_motion_time = time.time()
+                    if not motion_detected:
+                        motion_detected = True
+                        motion_start_time = last_motion_time
+                        logging.info("Motion detected")
+                        recorder.start()
+                        sound_ctrl.play_sound()
+
+                    (x, y, w, h) = cv2.boundingRect(contour)
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+
+            if motion_detected:
+                recorder.write(frame)
+
+                # Close the clip once motion has stopped so it can be indexed and pruned
+                if time.time() - last_motion_time > motion_timeout:
+                    recorder.close()
+                    motion_detected = False
+                    logging.info(f"Motion stopped after {time.time() - motion_start_time:.1f} seconds")
+                    storage.report()
+
+            # Add timestamp and motion status to frame
+            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            cv2.putText(frame, f"Time: {current_time}", 
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(frame, "Status: Motion Detected" if motion_detected else "Status: No Motion", 
+                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255) if motion_detected else (0, 255, 0), 2)
+
+            cv2.imshow('Motion Detection', frame)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
-            continue
-        
-        reconnect_attempts = 0  # Reset reconnect attempts on successful frame read
-
-        fgmask = fgbg.apply(frame)
-        _, thresh = cv2.threshold(fgmask, 244, 255, cv2.THRESH_BINARY)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for contour in contours:
-            if cv2.contourArea(contour) > motion_area_threshold:
-                if not motion_detected:
-                    motion_detected = True
-                    motion_start_time = time.time()
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                    video_writer = cv2.VideoWriter(f"motion_{timestamp}.avi", fourcc, 20, size)
-                    logging.info(f"Motion detected, starting recording: motion_{timestamp}.avi")
-                    sound_ctrl.play_sound()
-
-                (x, y, w, h) = cv2.boundingRect(contour)
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-
-        if motion_detected and video_writer is not None:
-            video_writer.write(frame)
-
-        # Add timestamp and motion status to frame
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(frame, f"Time: {current_time}", 
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(frame, "Status: Motion Detected" if motion_detected else "Status: No Motion", 
-                    (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255) if motion_detected else (0, 255, 0), 2)
-
-        cv2.imshow('Motion Detection', frame)
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    # Cleanup
-    cap.release()
-    if video_writer is not None:
-        video_writer.release()
-    sound_ctrl.stop_sound()
-
-    end_program_time = time.time()
-    logging.info(f"Total program execution time: {end_program_time - start_program_time} seconds")
-    cv2.destroyAllWindows()
+    finally:
+        # Cleanup
+        if cap is not None:
+            cap.release()
+        recorder.close()
+        sound_ctrl.stop_sound()
+        if owns_storage:
+            storage.stop()
+
+        end_program_time = time.time()
+        logging.info(f"Total program execution time: {end_program_time - start_program_time} seconds")
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     # Camera configuration examples for different types of cameras:
@@ -222,4 +241,15 @@ if __name__ == "__main__":
     #     'stream': 1  # 1 for main stream, 2 for sub stream
     # }
 
-    main(camera_config, motion_area_threshold=500, sound_file='sound.mp3')
\ No newline at end of file
+    # Keep at most 20 GB per camera, 100 GB in total and 14 days of recordings
+    storage = StorageManager(
+        root_dir='recordings',
+        camera_quota_bytes=20 * 1024**3,
+        global_quota_bytes=100 * 1024**3,
+        retention_days=14
+    )
+
+    try:
+        main(camera_config, motion_area_threshold=500, sound_file='sound.mp3', storage=storage)
+    finally:
+        storage.stop()
\ No newline at end of file
@@ -1,11 +1,11 @@
 import cv2
 import numpy as np
-import datetime
 import time
 from threading import Thread
 import pygame
 import os
 import logging
+from storage_manager import StorageManager, ClipRecorder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,7 +28,7 @@ def initialize_video_capture():
         return None
     return cap2
 
-def main(motion_area_threshold=500, sound_file='sound.mp3'):
+def main(motion_area_threshold=500, sound_file='sound.mp3', storage=None, motion_timeout=5.0, max_clip_seconds=300):
     start_program_time = time.time()
     
     cap = initialize_video_capture()
@@ -38,52 +38,66 @@ def main(motion_area_threshold=500, sound_file='sound.mp3'):
     frame_width = int(cap.get(3))
     frame_height = int(cap.get(4))
     size = (frame_width, frame_height)
-    
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+
+    # Recordings go through the storage manager so quotas and retention are enforced
+    owns_storage = storage is None
+    if owns_storage:
+        storage = StorageManager()
+
+    recorder = ClipRecorder(storage, 'webcam0', size, fps=20, max_clip_seconds=max_clip_seconds)
     motion_detected = False
-    video_writer = None
     fgbg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=True)
 
     motion_start_time = None
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            logging.error("Error: Could not read frame.")
-            break
-
-        fgmask = fgbg.apply(frame)
-        _, thresh = cv2.threshold(fgmask, 244, 255, cv2.THRESH_BINARY)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for contour in contours:
-            if cv2.contourArea(contour) > motion_area_threshold:
-                if not motion_detected:
-                    motion_detected = True
-                    motion_start_time = time.time()
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                    video_writer = cv2.VideoWriter(f"motion_{timestamp}.avi", fourcc, 20, size)
-                    logging.info(f"Motion detected, starting recording: motion_{timestamp}.avi")
-                    play_sound_non_blocking(sound_file)
-
-                (x, y, w, h) = cv2.boundingRect(contour)
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-
-        if motion_detected and video_writer is not None:
-            video_writer.write(frame)
-
-        cv2.imshow('Motion Detection', frame)
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    if video_writer is not None:
-        video_writer.release()
-
-    end_program_time = time.time()
-    logging.info(f"Total program execution time: {end_program_time - start_program_time} seconds")
-    cv2.destroyAllWindows()
+    last_motion_time = None
+
+    storage.start()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                logging.error("Error: Could not read frame.")
+                break
+
+            fgmask = fgbg.apply(frame)
+            _, thresh = cv2.threshold(fgmask, 244, 255, cv2.THRESH_BINARY)
+            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+            for contour in contours:
+                if cv2.contourArea(contour) > motion_area_threshold:
+                    last_motion_time = time.time()
+                    if not motion_detected:
+                        motion_detected = True
+                        motion_start_time = last_motion_time
+                        logging.info("Motion detected")
+                        recorder.start()
+                        play_sound_non_blocking(sound_file)
+
+                    (x, y, w, h) = cv2.boundingRect(contour)
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+
+            if motion_detected:
+                recorder.write(frame)
+
+                # Close the clip once motion has stopped so it can be indexed and pruned
+                if time.time() - last_motion_time > motion_timeout:
+                    recorder.close()
+                    motion_detected = False
+                    logging.info(f"Motion stopped after {time.time() - motion_start_time:.1f} seconds")
+
+            cv2.imshow('Motion Detection', frame)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        cap.release()
+        recorder.close()
+        if owns_storage:
+            storage.stop()
+
+        end_program_time = time.time()
+        logging.info(f"Total program execution time: {end_program_time - start_program_time} seconds")
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,335 @@
+import cv2
+import os
+import re
+import time
+import shutil
+import datetime
+import logging
+from collections import deque
+from threading import Thread, Event, Lock
+
+
+def _safe_name(name):
+    """
+    Turn a camera identifier (IP, name, ...) into a safe directory name
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(name)).strip('._') or 'camera'
+
+
+class StorageManager:
+    """
+    Places recordings in <root>/<camera>/<YYYY-MM-DD>/ and keeps the
+    recordings tree within per-camera and global byte quotas and an age limit.
+
+    Sizes are tracked in an in-memory index that is built once at startup and
+    updated as clips are registered or deleted, so pruning never re-walks the
+    tree. Pruning runs in a background thread, woken up whenever a new clip is
+    registered and at least every `prune_interval` seconds.
+
+    By default clips are kept for 30 days and the oldest clips are deleted
+    whenever less than 1 GB of disk space is left.
+    """
+
+    def __init__(self, root_dir='recordings', camera_quota_bytes=None, global_quota_bytes=None,
+                 retention_days=30, min_free_bytes=1024**3, prune_interval=60.0, throughput_window=60.0):
+        self.root_dir = os.path.abspath(root_dir)
+        self.camera_quota_bytes = camera_quota_bytes
+        self.global_quota_bytes = global_quota_bytes
+        self.retention_days = retention_days
+        self.min_free_bytes = min_free_bytes
+        self.prune_interval = prune_interval
+        self.throughput_window = throughput_window
+
+        self._lock = Lock()
+        self._index = {}          # path -> (camera, size, mtime)
+        self._camera_bytes = {}   # camera -> total bytes
+        self._total_bytes = 0
+        self._open_clips = {}     # path -> size when last sampled, for clips still being written
+        self._writes = deque()    # (time, bytes) written since the previous sample
+
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._thread = None
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._build_index()
+
+    def _build_index(self):
+        for camera in os.listdir(self.root_dir):
+            camera_dir = os.path.join(self.root_dir, camera)
+            if not os.path.isdir(camera_dir):
+                continue
+            for dirpath, _, filenames in os.walk(camera_dir):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    self._add(path, camera, st.st_size, st.st_mtime)
+        logging.info(f"Storage index built: {len(self._index)} clips, {self._total_bytes} bytes in {self.root_dir}")
+
+    def _add(self, path, camera, size, mtime):
+        self._index[path] = (camera, size, mtime)
+        self._camera_bytes[camera] = self._camera_bytes.get(camera, 0) + size
+        self._total_bytes += size
+
+    def _discard(self, path):
+        camera, size, _ = self._index.pop(path)
+        self._camera_bytes[camera] -= size
+        if self._camera_bytes[camera] <= 0:
+            del self._camera_bytes[camera]
+        self._total_bytes -= size
+
+    def clip_path(self, camera_id, prefix='motion', ext='avi'):
+        """
+        Return a new clip path for the camera, creating its day directory
+        """
+        now = datetime.datetime.now()
+        day_dir = os.path.join(self.root_dir, _safe_name(camera_id), now.strftime("%Y-%m-%d"))
+        path = os.path.join(day_dir, f"{prefix}_{now.strftime('%H-%M-%S')}.{ext}")
+        # Marking the clip as open under the lock keeps the pruner from
+        # removing its directory before the writer has created the file
+        with self._lock:
+            os.makedirs(day_dir, exist_ok=True)
+            self._open_clips[path] = 0
+        return path
+
+    def register_clip(self, camera_id, path):
+        """
+        Add a finished clip to the size index and schedule a prune
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard_clip(path)
+            logging.warning(f"Clip {path} not found, not registered")
+            return
+        with self._lock:
+            sampled = self._open_clips.pop(path, 0)
+            if st.st_size > sampled:
+                self._record_write(time.time(), st.st_size - sampled)
+            if path in self._index:
+                self._discard(path)
+            self._add(path, _safe_name(camera_id), st.st_size, st.st_mtime)
+        logging.info(f"Clip saved: {path} ({st.st_size} bytes)")
+        self._wakeup.set()
+
+    def discard_clip(self, path):
+        """
+        Forget an open clip that could not be written
+        """
+        with self._lock:
+            self._open_clips.pop(os.path.abspath(path), None)
+
+    def prune(self):
+        """
+        Delete expired clips, then the oldest clips until every quota is met.
+        Returns the number of bytes freed.
+        """
+        with self._lock:
+            by_age = sorted(self._index.items(), key=lambda item: item[1][2])
+            doomed = []
+
+            if self.retention_days is not None:
+                cutoff = time.time() - self.retention_days * 86400
+                doomed.extend(path for path, (_, _, mtime) in by_age if mtime < cutoff)
+
+            over_camera = {}
+            if self.camera_quota_bytes is not None:
+                for camera, used in self._camera_bytes.items():
+                    if used > self.camera_quota_bytes:
+                        over_camera[camera] = used - self.camera_quota_bytes
+            over_global = 0
+            if self.global_quota_bytes is not None:
+                over_global = max(0, self._total_bytes - self.global_quota_bytes)
+            if self.min_free_bytes is not None:
+                over_global = max(over_global, self.min_free_bytes - self.free_space())
+
+            # Expired clips count towards the quotas they were using
+            doomed_set = set(doomed)
+            for path in doomed:
+                camera, size, _ = self._index[path]
+                if camera in over_camera:
+                    over_camera[camera] -= size
+                over_global -= size
+
+            for path, (camera, size, _) in by_age:
+                if path in doomed_set:
+                    continue
+                if over_camera.get(camera, 0) > 0 or over_global > 0:
+                    doomed.append(path)
+                    doomed_set.add(path)
+                    if camera in over_camera:
+                        over_camera[camera] -= size
+                    over_global -= size
+
+        freed = 0
+        for path in doomed:
+            # Clips that could not be deleted stay in the index so the quotas keep counting them
+            removed = True
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                removed = False
+            except OSError as e:
+                logging.warning(f"Could not delete {path}: {e}")
+                continue
+            with self._lock:
+                if path in self._index:
+                    if removed:
+                        freed += self._index[path][1]
+                    self._discard(path)
+                self._remove_empty_dirs(os.path.dirname(path))
+            if removed:
+                logging.info(f"Pruned clip: {path}")
+        return freed
+
+    def _remove_empty_dirs(self, directory):
+        # Called with the lock held; directories of open clips are kept
+        open_dirs = {os.path.dirname(path) for path in self._open_clips}
+        while os.path.normpath(directory) != self.root_dir and directory not in open_dirs:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = Thread(target=self._run, name='storage-pruner', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._sample_open_clips()
+                freed = self.prune()
+                if freed:
+                    logging.info(f"Storage pruning freed {freed} bytes")
+            except Exception as e:
+                logging.error(f"Storage pruning failed: {e}")
+            self._wakeup.wait(self.prune_interval)
+            self._wakeup.clear()
+
+    def usage(self, camera_id=None):
+        """
+        Bytes used by one camera, or by all recordings when no camera is given
+        """
+        with self._lock:
+            if camera_id is None:
+                return self._total_bytes
+            return self._camera_bytes.get(_safe_name(camera_id), 0)
+
+    def free_space(self):
+        return shutil.disk_usage(self.root_dir).free
+
+    def _sample_open_clips(self):
+        """
+        Record how much each open clip has grown since it was last sampled
+        """
+        now = time.time()
+        with self._lock:
+            for path, sampled in self._open_clips.items():
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                if size > sampled:
+                    self._record_write(now, size - sampled)
+                    self._open_clips[path] = size
+
+    def _record_write(self, now, nbytes):
+        # Called with the lock held; samples older than the window are dropped
+        # here so the deque stays bounded even if nobody reads the throughput
+        self._writes.append((now, nbytes))
+        cutoff = now - self.throughput_window
+        while self._writes and self._writes[0][0] < cutoff:
+            self._writes.popleft()
+
+    def write_throughput(self):
+        """
+        Average bytes per second written over the last `throughput_window` seconds,
+        including clips that are still being recorded
+        """
+        self._sample_open_clips()
+        cutoff = time.time() - self.throughput_window
+        with self._lock:
+            while self._writes and self._writes[0][0] < cutoff:
+                self._writes.popleft()
+            written = sum(size for _, size in self._writes)
+        return written / self.throughput_window
+
+    def report(self):
+        stats = {
+            'used_bytes': self.usage(),
+            'free_bytes': self.free_space(),
+            'write_bytes_per_sec': self.write_throughput(),
+        }
+        logging.info(f"Storage: {stats['used_bytes']} bytes used, {stats['free_bytes']} bytes free, "
+                     f"{stats['write_bytes_per_sec']:.0f} B/s written")
+        return stats
+
+
+class ClipRecorder:
+    """
+    Writes motion clips for one camera into a StorageManager. A clip longer
+    than `max_clip_seconds` is closed and a new one started, so recordings of
+    continuous motion are indexed and pruned like any other clip.
+    """
+
+    def __init__(self, storage, camera_id, size, fps=20, fourcc='XVID', max_clip_seconds=300):
+        self.storage = storage
+        self.camera_id = camera_id
+        self.size = size
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.max_clip_seconds = max_clip_seconds
+        self.path = None
+        self.video_writer = None
+        self.clip_start_time = None
+
+    @property
+    def is_recording(self):
+        return self.video_writer is not None
+
+    def start(self):
+        """
+        Open a new clip; returns False if the video writer could not be opened
+        """
+        path = self.storage.clip_path(self.camera_id)
+        video_writer = cv2.VideoWriter(path, self.fourcc, self.fps, self.size)
+        if not video_writer.isOpened():
+            logging.error(f"Error: Could not open video writer for {path}")
+            self.storage.discard_clip(path)
+            return False
+        self.path = path
+        self.video_writer = video_writer
+        self.clip_start_time = time.time()
+        logging.info(f"Recording started: {path}")
+        return True
+
+    def write(self, frame):
+        if self.video_writer is None:
+            return
+        if time.time() - self.clip_start_time >= self.max_clip_seconds:
+            self.close()
+            if not self.start():
+                return
+        self.video_writer.write(frame)
+
+    def close(self):
+        if self.video_writer is not None:
+            self.video_writer.release()
+            self.video_writer = None
+            self.storage.register_clip(self.camera_id, self.path)
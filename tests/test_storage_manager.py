@@ -0,0 +1,117 @@
+import os
+import time
+
+import storage_manager
+from storage_manager import StorageManager
+
+
+def make_storage(tmp_path, **kwargs):
+    kwargs.setdefault('retention_days', None)
+    kwargs.setdefault('min_free_bytes', None)
+    return StorageManager(root_dir=str(tmp_path / 'recordings'), **kwargs)
+
+
+def make_clip(storage, camera_id, prefix, size, age_seconds=0):
+    path = storage.clip_path(camera_id, prefix=prefix)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    storage.register_clip(camera_id, path)
+    return path
+
+
+def test_retention_prunes_expired_clips(tmp_path):
+    storage = make_storage(tmp_path, retention_days=1)
+    old = make_clip(storage, 'cam1', 'old', 100, age_seconds=2 * 86400)
+    new = make_clip(storage, 'cam1', 'new', 100)
+
+    assert storage.prune() == 100
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+    assert storage.usage('cam1') == 100
+
+
+def test_camera_quota_prunes_oldest_first(tmp_path):
+    storage = make_storage(tmp_path, camera_quota_bytes=250)
+    clips = [make_clip(storage, 'cam1', f'c{i}', 100, age_seconds=100 - i) for i in range(4)]
+    other = make_clip(storage, 'cam2', 'c0', 100, age_seconds=1000)
+
+    assert storage.prune() == 200
+    assert [os.path.exists(path) for path in clips] == [False, False, True, True]
+    assert os.path.exists(other)
+    assert storage.usage('cam1') == 200
+    assert storage.usage('cam2') == 100
+
+
+def test_global_quota_prunes_oldest_across_cameras(tmp_path):
+    storage = make_storage(tmp_path, global_quota_bytes=200)
+    a_old = make_clip(storage, 'cam1', 'a', 100, age_seconds=30)
+    b_old = make_clip(storage, 'cam2', 'b', 100, age_seconds=20)
+    a_new = make_clip(storage, 'cam1', 'c', 100, age_seconds=10)
+    b_new = make_clip(storage, 'cam2', 'd', 100)
+
+    assert storage.prune() == 200
+    assert not os.path.exists(a_old)
+    assert not os.path.exists(b_old)
+    assert os.path.exists(a_new)
+    assert os.path.exists(b_new)
+    assert storage.usage() == 200
+
+
+def test_failed_delete_stays_in_index(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path, retention_days=1)
+    stuck = make_clip(storage, 'cam1', 'stuck', 100, age_seconds=2 * 86400)
+    gone = make_clip(storage, 'cam1', 'gone', 50, age_seconds=2 * 86400)
+
+    real_remove = os.remove
+
+    def remove(path):
+        if path == stuck:
+            raise PermissionError(path)
+        real_remove(path)
+
+    monkeypatch.setattr(storage_manager.os, 'remove', remove)
+
+    assert storage.prune() == 50
+    assert os.path.exists(stuck)
+    assert not os.path.exists(gone)
+    assert storage.usage() == 100
+    assert storage.usage('cam1') == 100
+
+
+def test_open_clip_directory_is_kept(tmp_path):
+    storage = make_storage(tmp_path, retention_days=1)
+    old = make_clip(storage, 'cam1', 'old', 100, age_seconds=2 * 86400)
+    # The writer has not created this file yet
+    pending = storage.clip_path('cam1', prefix='pending')
+
+    storage.prune()
+    assert not os.path.exists(old)
+    assert os.path.isdir(os.path.dirname(pending))
+
+    storage.discard_clip(pending)
+    make_clip(storage, 'cam1', 'old2', 100, age_seconds=2 * 86400)
+    storage.prune()
+    assert not os.path.exists(os.path.dirname(pending))
+
+
+def test_index_rebuilt_from_existing_tree(tmp_path):
+    storage = make_storage(tmp_path)
+    make_clip(storage, 'cam1', 'a', 100)
+    make_clip(storage, 'cam1', 'b', 50)
+    make_clip(storage, 'cam 2', 'c', 25)
+
+    rebuilt = make_storage(tmp_path)
+    assert rebuilt.usage() == 175
+    assert rebuilt.usage('cam1') == 150
+    assert rebuilt.usage('cam 2') == 25
+
+
+def test_write_samples_are_trimmed(tmp_path):
+    storage = make_storage(tmp_path, throughput_window=60.0)
+    storage._record_write(time.time() - 120, 1000)
+    make_clip(storage, 'cam1', 'a', 100)
+
+    assert len(storage._writes) == 1
+    assert storage.write_throughput() == 100 / 60.0
@@ -1,9 +1,10 @@
 import cv2
 import numpy as np
-import datetime
+import time
 import pygame
 import os
 import logging
+from storage_manager import StorageManager, ClipRecorder
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -43,11 +44,17 @@ class MotionMetrics:
                 self.true_negatives += 1
 
 class MotionDetector:
-    def __init__(self):
+    def __init__(self, storage=None, motion_timeout=5.0):
         # Background subtractor for adaptive background modeling
         self.back_sub = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=50)
         self.metrics = MotionMetrics()
         self.save_video = False
+        # Recordings go through the storage manager so quotas and retention are enforced;
+        # it is created when the first clip is recorded
+        self.storage = storage
+        self.recorder = None
+        self.motion_timeout = motion_timeout
+        self.last_motion_time = None
 
     def detect_motion(self, frame):
         fg_mask = self.back_sub.apply(frame)
@@ -71,21 +78,29 @@ class MotionDetector:
         return motion_detected
 
     def record_video(self, frame):
-        if not hasattr(self, "video_writer"):
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            self.video_writer = cv2.VideoWriter(
-                f"motion_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.avi",
-                fourcc, 20.0, (frame.shape[1], frame.shape[0])
-            )
-        self.video_writer.write(frame)
+        self.last_motion_time = time.time()
+        if self.recorder is None:
+            if self.storage is None:
+                self.storage = StorageManager()
+            self.storage.start()
+            recorder = ClipRecorder(self.storage, 'webcam0', (frame.shape[1], frame.shape[0]), fps=20.0)
+            if not recorder.start():
+                return
+            self.recorder = recorder
+        self.recorder.write(frame)
 
     def release_video(self):
-        if hasattr(self, "video_writer"):
-            self.video_writer.release()
-            delattr(self, "video_writer")
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
 
     def process_frame(self, frame, actual_motion=False):
         motion_detected = self.detect_motion(frame)
+        if motion_detected:
+            self.last_motion_time = time.time()
+        elif self.recorder is not None and time.time() - self.last_motion_time > self.motion_timeout:
+            # Close the clip once motion has stopped so it can be indexed and pruned
+            self.release_video()
         self.metrics.update_metrics(motion_detected, actual_motion)
         accuracy = self.metrics.calculate_accuracy()
         logging.info(f"Detection Accuracy: {accuracy:.2f}")
@@ -95,20 +110,23 @@ def run_motion_detection():
     cap = cv2.VideoCapture(0)  # Capture from the first webcam
     detector = MotionDetector()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        detector.process_frame(frame)
-
-        cv2.imshow("Motion Detection", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    detector.release_video()
-    cap.release()
-    cv2.destroyAllWindows()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            detector.process_frame(frame)
+
+            cv2.imshow("Motion Detection", frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        detector.release_video()
+        if detector.storage is not None:
+            detector.storage.stop()
+        cap.release()
+        cv2.destroyAllWindows()
 
 # Uncomment the line below to test the motion detection in a local environment.
 # run_motion_detection()